@@ -1,10 +1,18 @@
+# النسخة القديمة قبل إعادة الهيكلة — محفوظة للمرجعية فقط، لا تُستورد ولا تُشغّل.
+# Retired pre-refactor version, kept for reference only; superseded by main.py.
+
 from fastapi import FastAPI, Request, Form, Body, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from weasyprint import HTML, CSS
 from fontTools.ttLib import TTFont
+
+try:
+    from pybase64 import b64encode as _b64encode  # SIMD (SSSE3/AVX2) encoder
+except ImportError:
+    from base64 import b64encode as _b64encode
 from pathlib import Path
-import base64
+import contextlib
 import io
 import os
 
@@ -28,22 +36,25 @@ templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 WINDOWS_FONTS_DIR = Path(os.environ.get("WINDIR", r"C:\Windows")) / "Fonts"
 
 
-def font_supports_arabic(font_path: Path) -> bool:
+# نطاقات يونيكود العربية
+ARABIC_RANGES = (
+    (0x0600, 0x06FF),
+    (0x0750, 0x077F),
+    (0x08A0, 0x08FF),
+    (0xFB50, 0xFDFF),
+    (0xFE70, 0xFEFF),
+)
+
+
+def font_supports_arabic(font_path: str) -> bool:
     """تحقق إن كان الخط يحتوي على نطاقات يونيكود العربية."""
     try:
-        tt = TTFont(str(font_path))
-        for table in tt["cmap"].tables:
-            for codepoint in table.cmap.keys():
-                if (
-                    0x0600 <= codepoint <= 0x06FF or
-                    0x0750 <= codepoint <= 0x077F or
-                    0x08A0 <= codepoint <= 0x08FF or
-                    0xFB50 <= codepoint <= 0xFDFF or
-                    0xFE70 <= codepoint <= 0xFEFF
-                ):
-                    tt.close()
-                    return True
-        tt.close()
+        # lazy=True يؤجل فك الجداول فلا يُفك إلا جدول cmap
+        with contextlib.closing(TTFont(font_path, lazy=True, fontNumber=0)) as tt:
+            cmap = tt.getBestCmap() or {}
+        for lo, hi in ARABIC_RANGES:
+            if any(lo <= cp <= hi for cp in cmap):
+                return True
     except Exception:
         pass
     return False
@@ -55,19 +66,23 @@ def get_font_display_list():
     if not WINDOWS_FONTS_DIR.exists():
         return fonts
 
-    for f in WINDOWS_FONTS_DIR.iterdir():
-        if f.is_file() and f.suffix.lower() in {".ttf", ".otf"}:
-            if font_supports_arabic(f):
+    with os.scandir(WINDOWS_FONTS_DIR) as it:
+        for e in it:
+            if not e.name.lower().endswith((".ttf", ".otf")):
+                continue
+            if not e.is_file(follow_symlinks=False):
+                continue
+            if font_supports_arabic(e.path):
                 try:
-                    tt = TTFont(str(f))
-                    family_name = None
-                    for record in tt["name"].names:
-                        if record.nameID == 1:  # Font Family name
-                            family_name = record.toStr()
-                            break
-                    tt.close()
+                    with contextlib.closing(
+                        TTFont(e.path, lazy=True, fontNumber=0, ignoreDecompileErrors=True)
+                    ) as tt:
+                        name_table = tt["name"]
+                        family_name = (
+                            name_table.getBestFamilyName() or name_table.getDebugName(1)
+                        )
                     if family_name:
-                        fonts.append({"filename": f.name, "family": family_name})
+                        fonts.append({"filename": e.name, "family": family_name})
                 except Exception:
                     continue
     return sorted(fonts, key=lambda x: x["family"].lower())
@@ -152,5 +167,5 @@ async def convert_html(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {e}")
 
-    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    pdf_base64 = _b64encode(pdf_bytes).decode("ascii")
     return JSONResponse({"pdf_base64": pdf_base64})
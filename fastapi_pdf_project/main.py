@@ -1,19 +1,105 @@
 from typing import Optional, List, Tuple
 
 from fastapi import FastAPI, Request, Form, Body, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from starlette.datastructures import MutableHeaders
+
 from pydantic import BaseModel
 
 from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 from fontTools.ttLib import TTFont
 
+try:
+    import ahocorasick  # pyahocorasick: optional C-level multi-pattern matcher
+except ImportError:
+    ahocorasick = None
+
+try:
+    from pybase64 import b64encode as _b64encode  # SIMD (SSSE3/AVX2) encoder
+except ImportError:
+    from base64 import b64encode as _b64encode
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import base64
-import io
+import asyncio
+import contextlib
+import functools
+import gzip
+import hashlib
 import os
+import pickle
+import queue
 import re
+import tempfile
+import threading
+import time
+import urllib.request
+
+
+# ================== Response compression ==================
+class _JsonGzipMiddleware:
+    """
+    Compress complete (non-streamed) responses for gzip-capable clients.
+
+    Scoped replacement for Starlette's GZipMiddleware: the pinned 0.47
+    release gzips every response, which would corrupt the byte offsets of
+    206 Content-Range replies and waste CPU re-compressing already-deflated
+    application/pdf bodies. This only touches buffered responses outside
+    those cases — in practice the base64 JSON envelope.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = b""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value
+                break
+        if b"gzip" not in accept_encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def _send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the first body message tells us whether
+                # the response is buffered or streamed
+                start_message = message
+                return
+            if message["type"] == "http.response.body" and start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if (
+                    not message.get("more_body", False)
+                    and start_message["status"] != 206
+                    and len(body) >= self.minimum_size
+                    and not headers.get("content-type", "").startswith("application/pdf")
+                    and "content-encoding" not in headers
+                ):
+                    body = gzip.compress(body, compresslevel=self.compresslevel)
+                    headers["Content-Encoding"] = "gzip"
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {"type": "http.response.body", "body": body}
+                start, start_message = start_message, None
+                await send(start)
+            await send(message)
+
+        await self.app(scope, receive, _send)
 
 
 # ================== FastAPI metadata (shows in Swagger) ==================
@@ -28,6 +114,9 @@ app = FastAPI(
     contact={"name": "Mahmood-Shaker"}
 )
 
+# Base64 JSON responses compress well; gzip shrinks them on the wire
+app.add_middleware(_JsonGzipMiddleware, minimum_size=1024, compresslevel=5)
+
 # ================== Paths & Templates ==================
 BASE_DIR = Path(__file__).parent.resolve()
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
@@ -35,80 +124,204 @@ templates = Jinja2Templates(directory=BASE_DIR / "templates")
 # Windows Fonts folder
 WINDOWS_FONTS_DIR = Path(os.environ.get("WINDIR", r"C:\Windows")) / "Fonts"
 
+# On-disk cache for font scan results (survives restarts)
+FONT_CACHE_FILE = (
+    Path(os.environ.get("LOCALAPPDATA", tempfile.gettempdir()))
+    / "fastapi_pdf_project"
+    / "font_cache.pkl"
+)
+
+
+# Shared fontconfig context: @font-face rules are loaded once per process
+# instead of once per request
+FONT_CONFIG = FontConfiguration()
+
 
 # ================== Helpers: fonts & rendering ==================
-def font_supports_arabic(font_path: Path) -> bool:
+# Arabic Unicode blocks (basic, supplement, extended-A, presentation forms A/B)
+ARABIC_RANGES = (
+    (0x0600, 0x06FF),
+    (0x0750, 0x077F),
+    (0x08A0, 0x08FF),
+    (0xFB50, 0xFDFF),
+    (0xFE70, 0xFEFF),
+)
+
+
+def _build_arabic_bitmap() -> bytes:
+    """Union of ARABIC_RANGES as a BMP-wide bitmap (8 KiB, one bit per codepoint)."""
+    bitmap = bytearray(0x10000 // 8)
+    for lo, hi in ARABIC_RANGES:
+        for cp in range(lo, hi + 1):
+            bitmap[cp >> 3] |= 1 << (cp & 7)
+    return bytes(bitmap)
+
+
+_ARABIC_BITMAP = _build_arabic_bitmap()
+
+
+def _is_arabic(cp: int) -> bool:
+    """Single indexed-byte + mask test instead of five range comparisons."""
+    return cp < 0x10000 and (_ARABIC_BITMAP[cp >> 3] >> (cp & 7)) & 1 == 1
+
+
+def font_supports_arabic(font_path: str) -> bool:
     """Check if font contains Arabic Unicode blocks."""
     try:
-        tt = TTFont(str(font_path))
-        for table in tt["cmap"].tables:
-            for codepoint in table.cmap.keys():
-                if (
-                    0x0600 <= codepoint <= 0x06FF or
-                    0x0750 <= codepoint <= 0x077F or
-                    0x08A0 <= codepoint <= 0x08FF or
-                    0xFB50 <= codepoint <= 0xFDFF or
-                    0xFE70 <= codepoint <= 0xFEFF
-                ):
-                    tt.close()
-                    return True
-        tt.close()
+        # lazy=True defers table parsing so only the cmap is ever decompiled
+        with contextlib.closing(TTFont(font_path, lazy=True, fontNumber=0)) as tt:
+            cmap = tt.getBestCmap() or {}
+        if any(_is_arabic(cp) for cp in cmap):
+            return True
     except Exception:
         pass
     return False
 
 
-def get_font_display_list():
-    """Return Arabic-supporting fonts: filename + internal family name."""
-    fonts = []
-    if not WINDOWS_FONTS_DIR.exists():
-        return fonts
-
-    for f in WINDOWS_FONTS_DIR.iterdir():
-        if f.is_file() and f.suffix.lower() in {".ttf", ".otf"}:
-            if font_supports_arabic(f):
-                try:
-                    tt = TTFont(str(f))
-                    family_name = None
-                    for record in tt["name"].names:
-                        if record.nameID == 1:  # Font Family name
-                            family_name = (
-                                record.toUnicode()
-                                if hasattr(record, "toUnicode")
-                                else record.toStr()
-                            )
-                            break
-                    tt.close()
-                    if family_name:
-                        fonts.append({"filename": f.name, "family": family_name})
-                except Exception:
-                    continue
-    return sorted(fonts, key=lambda x: x["family"].lower())
-
-
-def get_family_from_fontfile(font_path: Path) -> Optional[str]:
+def get_family_from_fontfile(font_path: str) -> Optional[str]:
     """Extract the internal family name from a font file."""
     try:
-        tt = TTFont(str(font_path))
-        family_name = None
-        for record in tt["name"].names:
-            if record.nameID == 1:
-                family_name = (
-                    record.toUnicode()
-                    if hasattr(record, "toUnicode")
-                    else record.toStr()
-                )
-                break
-        tt.close()
+        # lazy=True so only the name table is decompiled
+        with contextlib.closing(
+            TTFont(font_path, lazy=True, fontNumber=0, ignoreDecompileErrors=True)
+        ) as tt:
+            name_table = tt["name"]
+            # Prefers Windows/Unicode records and decodes properly
+            family_name = (
+                name_table.getBestFamilyName() or name_table.getDebugName(1)
+            )
         return family_name
     except Exception:
         return None
 
 
-def build_css(font_family: Optional[str], font_path_uri: Optional[str]) -> CSS:
+# Bump when the cached entry layout changes so stale pickles are discarded
+_CACHE_FORMAT = 2
+
+# Shared pool for the font sweep: the per-file work is I/O-dominated
+# (small file reads + struct unpacking), so threads scale well here.
+_SCAN_POOL = ThreadPoolExecutor(max_workers=(os.cpu_count() or 4) * 2)
+
+
+class _FontCache:
     """
-    Build CSS for A4 pages with header/footer space and optional user-selected font.
+    Persistent cache of the Arabic-font scan, keyed by (path, mtime_ns, size).
+
+    Font files are parsed with TTFont only when new or changed since the last
+    scan; results are pickled to FONT_CACHE_FILE so restarts skip the
+    expensive per-file parsing entirely.
     """
+
+    def __init__(self, cache_file: Path):
+        self._cache_file = cache_file
+        self._entries = {}  # (path, st_mtime_ns, st_size) -> entry dict or None
+        self._loaded = False
+        self._fonts = None  # memoized sorted list + filename lookup
+        self._by_filename = None
+        # Hit from async handlers, thread-pooled sync routes and to_thread
+        # renders concurrently, so all state changes happen under a lock
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self._cache_file, "rb") as fh:
+                version, entries = pickle.load(fh)
+            self._entries = entries if version == _CACHE_FORMAT else {}
+        except Exception:
+            self._entries = {}
+        self._loaded = True
+
+    def _save(self):
+        """Rewrite the pickle atomically (temp file + os.replace)."""
+        try:
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self._cache_file.parent))
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(
+                    (_CACHE_FORMAT, self._entries), fh, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp_path, self._cache_file)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _scan_one(entry: os.DirEntry):
+        """Parse a single font file; None if it doesn't qualify."""
+        if not font_supports_arabic(entry.path):
+            return None
+        family_name = get_family_from_fontfile(entry.path)
+        if not family_name:
+            return None
+        return {
+            "filename": entry.name,
+            "family": family_name,
+            # Resolved once here so requests never pay for resolve()/as_uri()
+            "uri": Path(entry.path).resolve().as_uri(),
+        }
+
+    def get(self):
+        """Return Arabic-supporting fonts, re-parsing only new/changed files."""
+        with self._lock:
+            return self._get_locked()
+
+    def by_filename(self):
+        """Mapping of {filename: entry} for O(1) font validation/lookup."""
+        with self._lock:
+            self._get_locked()
+            return self._by_filename
+
+    def _get_locked(self):
+        if not self._loaded:
+            self._load()
+        if not WINDOWS_FONTS_DIR.exists():
+            # Keep the memoized views in sync so by_filename() stays a dict
+            self._fonts = []
+            self._by_filename = {}
+            return self._fonts
+
+        fresh = {}
+        dirty = False
+        misses = []
+        with os.scandir(WINDOWS_FONTS_DIR) as it:
+            for entry in it:
+                if not entry.name.lower().endswith((".ttf", ".otf")):
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat()
+                key = (entry.path, stat.st_mtime_ns, stat.st_size)
+                if key in self._entries:
+                    fresh[key] = self._entries[key]
+                else:
+                    misses.append((key, entry))
+
+        # Parse new/changed files in parallel (cache hits skip this entirely)
+        if misses:
+            dirty = True
+            results = _SCAN_POOL.map(self._scan_one, [e for _, e in misses])
+            for (key, _), result in zip(misses, results):
+                fresh[key] = result
+
+        # Drop entries whose files vanished or changed
+        if len(fresh) != len(self._entries):
+            dirty = True
+        if dirty:
+            self._entries = fresh
+            self._fonts = None
+            self._save()
+
+        if self._fonts is None:
+            fonts = [e for e in self._entries.values() if e]
+            self._fonts = sorted(fonts, key=lambda x: x["family"].lower())
+            self._by_filename = {f["filename"]: f for f in self._fonts}
+        return self._fonts
+
+
+_FONT_CACHE = _FontCache(FONT_CACHE_FILE)
+
+
+def _css_text(font_family: Optional[str], font_path_uri: Optional[str]) -> str:
+    """Compose the stylesheet text for A4 pages and an optional user font."""
     # --- نصوص الهيدر والفوتر الافتراضية ---
     HEADER_TEXT = ""
     FOOTER_LEFT = ""
@@ -169,13 +382,170 @@ def build_css(font_family: Optional[str], font_path_uri: Optional[str]) -> CSS:
             }}
         """
 
-    return CSS(string=css_text)
+    return css_text
+
+
+@functools.lru_cache(maxsize=128)
+def _build_css_cached(font_family: Optional[str], font_path_uri: Optional[str]) -> CSS:
+    return CSS(string=_css_text(font_family, font_path_uri), font_config=FONT_CONFIG)
+
+
+# Family names are interpolated into the stylesheet, so only accept a
+# conservative character set; anything else could break out of the CSS string.
+_SAFE_FAMILY_RE = re.compile(r"^[A-Za-z0-9 _\-\.]{1,64}$")
+
+
+def build_css(font_family: Optional[str], font_path_uri: Optional[str]) -> CSS:
+    """
+    Build CSS for A4 pages with header/footer space and optional user-selected font.
+
+    The parsed CSS object is immutable for a given (family, uri) pair, so it
+    is cached and shared across requests instead of re-parsed every time.
+    """
+    if font_family and not _SAFE_FAMILY_RE.match(font_family):
+        raise HTTPException(status_code=400, detail="Invalid font_family.")
+    return _build_css_cached(font_family, font_path_uri)
+
+
+def render_pdf_to(
+    target,
+    html: str,
+    css: CSS,
+    optimize_images: bool = True,
+    jpeg_quality: int = 85,
+    dpi: int = 96,
+) -> None:
+    """Render the PDF directly into a writable file-like target.
+
+    Image recompression is on by default: it shrinks output size and peak
+    RAM for image-heavy documents at a small fidelity cost.
+    """
+    HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
+        target,
+        stylesheets=[css],
+        font_config=FONT_CONFIG,
+        optimize_images=optimize_images,
+        jpeg_quality=jpeg_quality,
+        dpi=dpi,
+    )
+
+
+class _BytearrayWriter:
+    """Minimal write() target appending into a single bytearray.
+
+    Unlike BytesIO + getvalue(), the rendered document is never held in
+    two buffers at once.
+    """
+
+    __slots__ = ("buf",)
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, data) -> int:
+        self.buf += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def render_pdf_bytes(
+    html: str,
+    css: CSS,
+    optimize_images: bool = True,
+    jpeg_quality: int = 85,
+    dpi: int = 96,
+) -> bytearray:
+    writer = _BytearrayWriter()
+    render_pdf_to(writer, html, css, optimize_images, jpeg_quality, dpi)
+    return writer.buf
+
+
+# 64 KiB chunks keep memory flat while still batching queue traffic
+PDF_STREAM_CHUNK = 64 * 1024
+
 
+class _StreamCancelled(Exception):
+    """Raised inside the render thread when the client went away."""
 
-def render_pdf_bytes(html: str, css: CSS) -> bytes:
-    pdf_io = io.BytesIO()
-    HTML(string=html, base_url=str(BASE_DIR)).write_pdf(pdf_io, stylesheets=[css])
-    return pdf_io.getvalue()
+
+class _QueueWriter:
+    """File-like target that pushes fixed-size chunks into a queue."""
+
+    def __init__(self, q: queue.Queue, cancelled: threading.Event):
+        self._q = q
+        self._cancelled = cancelled
+        self._buf = bytearray()
+
+    def _put(self, chunk: bytes) -> None:
+        # Never block forever on a full queue: if the consumer is gone the
+        # cancellation flag aborts the render instead of leaking this thread.
+        while True:
+            if self._cancelled.is_set():
+                raise _StreamCancelled()
+            try:
+                self._q.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data) -> int:
+        self._buf += data
+        while len(self._buf) >= PDF_STREAM_CHUNK:
+            self._put(bytes(self._buf[:PDF_STREAM_CHUNK]))
+            del self._buf[:PDF_STREAM_CHUNK]
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        if self._buf:
+            self._put(bytes(self._buf))
+            self._buf = bytearray()
+
+
+async def stream_pdf_chunks(html: str, css: CSS):
+    """Yield PDF chunks while WeasyPrint renders in a worker thread."""
+    q: queue.Queue = queue.Queue(maxsize=8)
+    cancelled = threading.Event()
+
+    def _render():
+        writer = _QueueWriter(q, cancelled)
+        try:
+            render_pdf_to(writer, html, css)
+            writer.finish()
+            writer._put(None)  # sentinel: render finished
+        except _StreamCancelled:
+            pass
+        except Exception as exc:
+            with contextlib.suppress(_StreamCancelled):
+                writer._put(exc)
+
+    render_task = asyncio.ensure_future(asyncio.to_thread(_render))
+    try:
+        while True:
+            item = await asyncio.to_thread(q.get)
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                # The response already started, so no status code can be
+                # changed here; re-raise the render error itself so the
+                # aborted stream is attributed to the real cause in the logs.
+                raise item
+            yield item
+    finally:
+        # On client disconnect, unblock and stop the render thread before
+        # awaiting it, otherwise a writer stuck on the full queue deadlocks
+        # and leaks a default-executor thread per aborted download.
+        cancelled.set()
+        while not render_task.done():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                await asyncio.sleep(0.05)
+        await render_task
 
 
 # ================== Font extraction from HTML ==================
@@ -198,12 +568,46 @@ def extract_font_family_candidates(html: str) -> List[str]:
     return candidates
 
 
+# Aho-Corasick automaton over known family names, rebuilt when the font list changes
+_AC_AUTOMATON = None
+_AC_KEY = None
+
+
+def _family_automaton(fonts):
+    """Build (and reuse) an automaton matching all known family names at once."""
+    global _AC_AUTOMATON, _AC_KEY
+    if ahocorasick is None:
+        return None
+    key = tuple((f["family"], f["filename"]) for f in fonts)
+    if key != _AC_KEY:
+        ac = ahocorasick.Automaton()
+        for f in fonts:
+            ac.add_word(f["family"].strip().lower(), (f["family"], f["filename"]))
+        ac.make_automaton()
+        _AC_AUTOMATON = ac
+        _AC_KEY = key
+    return _AC_AUTOMATON
+
+
 def choose_font_from_html(html: str) -> Tuple[Optional[str], Optional[str]]:
-    mapping = {f["family"].strip().lower(): f["filename"] for f in get_font_display_list()}
-    for fam in extract_font_family_candidates(html):
-        key = fam.strip().lower()
-        if key in mapping:
-            return fam, mapping[key]
+    fonts = _FONT_CACHE.get()
+    mapping = {f["family"].strip().lower(): f["filename"] for f in fonts}
+
+    # The automaton is only a prefilter: a raw substring hit anywhere in the
+    # HTML can shadow a longer family ("Amiri" vs "Amiri Quran") or match
+    # prose outside any font-family declaration, so the extracted
+    # declarations with exact family names stay authoritative.
+    automaton = _family_automaton(fonts)
+    no_known_family = (
+        automaton is not None
+        and html
+        and next(automaton.iter(html.lower()), None) is None
+    )
+    if not no_known_family:
+        for fam in extract_font_family_candidates(html):
+            key = fam.strip().lower()
+            if key in mapping:
+                return fam, mapping[key]
 
     for fallback in ["Traditional Arabic", "Arial", "Tahoma", "Noto Kufi Arabic", "Segoe UI"]:
         key = fallback.lower()
@@ -213,6 +617,89 @@ def choose_font_from_html(html: str) -> Tuple[Optional[str], Optional[str]]:
     return None, None
 
 
+def resolve_css(html: str, font_family: Optional[str], font_filename: Optional[str]) -> CSS:
+    """Pick a font (explicit or inferred from the HTML) and build the page CSS."""
+    caller_supplied = bool(font_family)
+    if not font_filename or not font_family:
+        chosen_family, chosen_filename = choose_font_from_html(html)
+        font_family = font_family or chosen_family
+        font_filename = font_filename or chosen_filename
+
+    # Validate against the cached mapping instead of touching the disk
+    if font_family and font_filename:
+        entry = _FONT_CACHE.by_filename().get(font_filename)
+        if entry:
+            if _SAFE_FAMILY_RE.match(font_family):
+                return build_css(font_family, entry["uri"])
+            # Only reject values the caller sent; an auto-chosen family the
+            # server read from the font itself just falls back to no font.
+            if caller_supplied:
+                raise HTTPException(status_code=400, detail="Invalid font_family.")
+    return build_css(None, None)
+
+
+# ================== Image prefetching ==================
+IMG_SRC_REGEX = re.compile(
+    r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])(https?://[^"\']+)\2',
+    re.IGNORECASE,
+)
+
+IMAGE_FETCH_TIMEOUT = 10  # seconds per image
+
+
+@functools.lru_cache(maxsize=64)
+def _fetch_image_data_uri(url: str) -> Optional[str]:
+    """Download an image and return it as a data: URI (cached across requests)."""
+    try:
+        with urllib.request.urlopen(url, timeout=IMAGE_FETCH_TIMEOUT) as resp:
+            content_type = resp.headers.get_content_type()
+            data = resp.read()
+        if not content_type.startswith("image/"):
+            return None
+        return f"data:{content_type};base64,{_b64encode(data).decode('ascii')}"
+    except Exception:
+        return None
+
+
+async def inline_remote_images(html: str) -> str:
+    """
+    Rewrite remote <img> sources to data: URIs, downloading them concurrently.
+
+    WeasyPrint fetches external images serially inside write_pdf; prefetching
+    in parallel caps the total download cost at the slowest single image.
+    """
+    if not html or "<img" not in html.lower():
+        return html
+
+    urls = list({m.group(3) for m in IMG_SRC_REGEX.finditer(html)})
+    if not urls:
+        return html
+
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_fetch_image_data_uri, u) for u in urls)
+    )
+    data_uris = dict(zip(urls, results))
+
+    def _sub(m):
+        data_uri = data_uris.get(m.group(3))
+        if not data_uri:
+            return m.group(0)  # leave unreachable images to WeasyPrint
+        return f"{m.group(1)}{m.group(2)}{data_uri}{m.group(2)}"
+
+    return IMG_SRC_REGEX.sub(_sub, html)
+
+
+def get_font_display_list():
+    """Client-facing view of the cached fonts: filename + family only.
+
+    The cache entries also carry the resolved file:// URI, which is an
+    internal detail and must not leak server filesystem paths to clients.
+    """
+    return [
+        {"filename": f["filename"], "family": f["family"]} for f in _FONT_CACHE.get()
+    ]
+
+
 # ================== UI ==================
 @app.get("/", summary="نموذج HTML للاختبار", tags=["UI"])
 async def form_page(request: Request):
@@ -229,6 +716,7 @@ def list_fonts():
 # ================== convert-html (returns Base64) ==================
 @app.post("/api/convert-html", tags=["Conversion"])
 async def convert_html(
+    request: Request,
     html_content: str = Form(None),
     font_filename: str = Form(None),
     font_family: str = Form(None),
@@ -242,37 +730,147 @@ async def convert_html(
     if not html_content:
         raise HTTPException(status_code=400, detail="Missing html_content.")
 
-    chosen_family, chosen_filename = None, None
-    if not font_filename or not font_family:
-        chosen_family, chosen_filename = choose_font_from_html(html_content)
-
-    font_family = font_family or chosen_family
-    font_filename = font_filename or chosen_filename
-
-    if font_family and font_filename:
-        font_path = (WINDOWS_FONTS_DIR / font_filename).resolve()
-        if not font_path.exists():
-            css = build_css(None, None)
-        else:
-            css = build_css(font_family, font_path.as_uri())
-    else:
-        css = build_css(None, None)
+    html_content = await inline_remote_images(html_content)
+    css = resolve_css(html_content, font_family, font_filename)
 
     try:
-        pdf_bytes = render_pdf_bytes(html_content, css)
+        # Render in a worker thread so one large PDF doesn't freeze the event loop
+        pdf_bytes = await asyncio.to_thread(render_pdf_bytes, html_content, css)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {e}")
 
-    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    # PDF-aware clients skip the base64/JSON envelope entirely
+    if "application/pdf" in request.headers.get("accept", ""):
+        return Response(
+            content=bytes(pdf_bytes),
+            media_type="application/pdf",
+            headers={"Content-Length": str(len(pdf_bytes))},
+        )
+
+    pdf_base64 = _b64encode(pdf_bytes).decode("ascii")
     return JSONResponse({"pdf_base64": pdf_base64})
 
 
+# ================== convert-html/stream (streams application/pdf) ==================
+@app.post("/api/convert-html/stream", tags=["Conversion"])
+async def convert_html_stream(
+    html_content: str = Form(None),
+    font_filename: str = Form(None),
+    font_family: str = Form(None),
+    json_data: dict = Body(None)
+):
+    """
+    مثل convert-html لكن يبث الـ PDF مباشرة بدون Base64 ولا تخزين كامل في الذاكرة.
+    """
+    if json_data:
+        html_content = json_data.get("html_content")
+        font_filename = json_data.get("font_filename")
+        font_family = json_data.get("font_family")
+
+    if not html_content:
+        raise HTTPException(status_code=400, detail="Missing html_content.")
+
+    html_content = await inline_remote_images(html_content)
+    css = resolve_css(html_content, font_family, font_filename)
+    return StreamingResponse(
+        stream_pdf_chunks(html_content, css),
+        media_type="application/pdf",
+    )
+
+
+# ================== Rendered-PDF store (Range / resumable downloads) ==================
+PDF_STORE_MAX = 32
+PDF_STORE_TTL = 300  # seconds
+
+
+class _PdfStore:
+    """Small TTL-LRU of recently rendered PDFs keyed by content hash."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._items = OrderedDict()  # sha -> (expires_at, bytes)
+        self._lock = threading.Lock()
+
+    def put(self, data) -> str:
+        sha = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._lock:
+            self._items.pop(sha, None)
+            self._items[sha] = (time.monotonic() + self._ttl, bytes(data))
+            while len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+        return sha
+
+    def get(self, sha: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(sha)
+            if item is None:
+                return None
+            expires_at, data = item
+            if expires_at < time.monotonic():
+                del self._items[sha]
+                return None
+            self._items.move_to_end(sha)
+            return data
+
+
+_PDF_STORE = _PdfStore(PDF_STORE_MAX, PDF_STORE_TTL)
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+@app.get("/api/pdf/{sha}", tags=["Conversion"], summary="تنزيل PDF سبق توليده (يدعم Range)")
+async def get_pdf(sha: str, request: Request):
+    """يخدم PDF من المخزن المؤقت مع دعم Range لاستئناف التنزيلات الكبيرة."""
+    data = _PDF_STORE.get(sha)
+    if data is None:
+        raise HTTPException(status_code=404, detail="PDF expired or unknown.")
+
+    total = len(data)
+    base_headers = {"Accept-Ranges": "bytes", "ETag": f'"{sha}"'}
+
+    range_header = request.headers.get("range")
+    if not range_header:
+        return Response(data, media_type="application/pdf", headers=base_headers)
+
+    # Per RFC 7233, forms we don't support (multipart ranges, malformed
+    # values) are ignored rather than rejected: serve the full body.
+    m = _RANGE_RE.match(range_header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return Response(data, media_type="application/pdf", headers=base_headers)
+
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else total - 1
+    else:
+        # Suffix range: last N bytes
+        start = max(total - int(m.group(2)), 0)
+        end = total - 1
+
+    if start >= total or end < start:
+        return Response(
+            status_code=416,
+            headers={**base_headers, "Content-Range": f"bytes */{total}"},
+        )
+
+    end = min(end, total - 1)
+    return Response(
+        data[start:end + 1],
+        status_code=206,
+        media_type="application/pdf",
+        headers={**base_headers, "Content-Range": f"bytes {start}-{end}/{total}"},
+    )
+
+
 # ================== savepdf (returns application/pdf) ==================
 class SavePdfPayload(BaseModel):
     HtmlContent: str
     FileName: Optional[str] = None
     FontFileName: Optional[str] = None
     FontFamily: Optional[str] = None
+    OptimizeImages: bool = True
+    JpegQuality: int = 85
+    Dpi: int = 96
 
 
 @app.post("/api/pdf/savepdf", tags=["Conversion"])
@@ -282,27 +880,26 @@ async def save_pdf(payload: SavePdfPayload):
         raise HTTPException(status_code=400, detail="HtmlContent is required.")
 
     file_name = payload.FileName or "document.pdf"
-    font_family = payload.FontFamily
-    font_filename = payload.FontFileName
-
-    if not font_family or not font_filename:
-        auto_family, auto_filename = choose_font_from_html(html)
-        font_family = font_family or auto_family
-        font_filename = font_filename or auto_filename
-
-    if font_family and font_filename:
-        font_path = (WINDOWS_FONTS_DIR / font_filename).resolve()
-        if not font_path.exists():
-            css = build_css(None, None)
-        else:
-            css = build_css(font_family, font_path.as_uri())
-    else:
-        css = build_css(None, None)
+    html = await inline_remote_images(html)
+    css = resolve_css(html, payload.FontFamily, payload.FontFileName)
 
     try:
-        pdf_bytes = render_pdf_bytes(html, css)
+        pdf_bytes = await asyncio.to_thread(
+            render_pdf_bytes,
+            html,
+            css,
+            optimize_images=payload.OptimizeImages,
+            jpeg_quality=payload.JpegQuality,
+            dpi=payload.Dpi,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {e}")
 
-    headers = {"Content-Disposition": f'attachment; filename="{file_name}"'}
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers=headers)
+    # Keep the result around briefly so dropped transfers can resume via Range
+    sha = _PDF_STORE.put(pdf_bytes)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{file_name}"',
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{sha}"',
+    }
+    return Response(bytes(pdf_bytes), media_type="application/pdf", headers=headers)